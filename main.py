@@ -1,45 +1,125 @@
+import hashlib
+import hmac
 import os
-from fastapi import FastAPI, HTTPException, Header
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+import numpy as np
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from enum import Enum
+
+from database import db, close_client, create_document
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Seed the printer catalog once at startup (idempotent upserts) so
+    # list_printers doesn't have to check per request. Non-critical seed
+    # data, so the writes go out as one unordered, unacknowledged batch
+    # instead of serialized per-document acks.
+    if db is not None:
+        try:
+            seed_coll = db[PRINTER_COLLECTION].with_options(write_concern=WriteConcern(w=0))
+            await seed_coll.bulk_write(
+                [
+                    UpdateOne(
+                        {"title": p["title"]},
+                        {"$setOnInsert": {**p, "created_at": datetime.utcnow()}},
+                        upsert=True,
+                    )
+                    for p in SAMPLE_PRINTERS
+                ],
+                ordered=False,
+            )
+            # Compound index so list_orders is an index scan (filter + sort)
+            # instead of a collection scan with an in-memory sort.
+            await db[QUOTE_COLLECTION].create_index([("email", 1), ("created_at", -1)])
+        except Exception:
+            pass
+    yield
+    close_client()
 
-from database import db, create_document, get_documents
+app = FastAPI(title="ChromaPrint API", version="0.1.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
-app = FastAPI(title="ChromaPrint API", version="0.1.0")
+# Fixed origin list: "*" with allow_credentials=True is invalid per spec,
+# and an explicit tuple lets Starlette take the fast path instead of
+# reflecting the origin per request. max_age caches preflights for 24h.
+ALLOWED_ORIGINS = (os.getenv("FRONTEND_ORIGIN", "https://app.chromaprint.in"),)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST"),
+    allow_headers=("authorization", "content-type", "x-demo-token"),
+    max_age=86400,
 )
 
 # -----------------------------
 # Models (request bodies)
 # -----------------------------
+class Material(str, Enum):
+    PLA = "PLA"
+    ABS = "ABS"
+    RESIN = "Resin"
+    NYLON = "Nylon"
+    PETG = "PETG"
+
+class Finish(str, Enum):
+    STANDARD = "Standard"
+    SMOOTH = "Smooth"
+    HIGH_GLOSS = "High-Gloss"
+    MATTE = "Matte"
+
 class LoginRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     email: str
     password: str
 
 class EstimateRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     length_mm: float = Field(..., gt=0)
     width_mm: float = Field(..., gt=0)
     height_mm: float = Field(..., gt=0)
-    material: str = Field(..., description="PLA | ABS | Resin | Nylon | PETG")
-    finish: str = Field(..., description="Standard | Smooth | High-Gloss | Matte")
+    material: Material = Field(..., description="PLA | ABS | Resin | Nylon | PETG")
+    finish: Finish = Field(..., description="Standard | Smooth | High-Gloss | Matte")
     complexity: float = Field(1.0, ge=0.5, le=2.0, description="Complexity multiplier")
     infill: float = Field(0.2, ge=0.05, le=1.0, description="0-1 infill density")
     model_volume_mm3: Optional[float] = Field(None, ge=0)
 
 class QuoteRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     email: str
     name: Optional[str] = None
     estimate: Dict[str, Any]
     notes: Optional[str] = None
 
+# Response models. These are built with model_construct() from values we
+# computed ourselves, skipping a redundant validation pass on the way out.
+class BreakdownModel(BaseModel):
+    volume_cm3: float
+    material_rate_inr_per_cm3: float
+    machine_time_hours: float
+    finish_multiplier: float
+    complexity: float
+    line_items: Dict[str, float]
+
+class EstimateResponse(BaseModel):
+    currency: str
+    estimated_cost: float
+    breakdown: BreakdownModel
+
 # -----------------------------
 # Utilities and seed data
 # -----------------------------
@@ -47,6 +127,9 @@ DEMO_EMAIL = os.getenv("DEMO_EMAIL", "ankitmht42@gmail.com")
 DEMO_PASSWORD = os.getenv("DEMO_PASSWORD", "Ankitmehta007")
 DEMO_TOKEN = "demo-token-123"
 
+# Digest computed once at import; login compares digests in constant time.
+_DEMO_PW_HASH = hashlib.sha256(DEMO_PASSWORD.encode()).digest()
+
 PRINTER_COLLECTION = "printer"
 QUOTE_COLLECTION = "quote"
 
@@ -77,19 +160,25 @@ SAMPLE_PRINTERS = [
     }
 ]
 
+# The fallback catalog is constant, so serialize it once at import and
+# serve the bytes directly when the database is unavailable.
+_SAMPLE_PRINTERS_JSON = orjson.dumps({"items": SAMPLE_PRINTERS})
+
+# Enum-keyed so the hot-path lookup hashes by member identity rather than
+# re-hashing the raw string; invalid values are rejected at parse time.
 MATERIAL_RATE_PER_CM3_INR = {
-    "PLA": 4.0,
-    "ABS": 5.0,
-    "Resin": 12.0,
-    "Nylon": 9.0,
-    "PETG": 6.0,
+    Material.PLA: 4.0,
+    Material.ABS: 5.0,
+    Material.RESIN: 12.0,
+    Material.NYLON: 9.0,
+    Material.PETG: 6.0,
 }
 
 FINISH_MULTIPLIER = {
-    "Standard": 1.0,
-    "Smooth": 1.15,
-    "High-Gloss": 1.3,
-    "Matte": 1.1,
+    Finish.STANDARD: 1.0,
+    Finish.SMOOTH: 1.15,
+    Finish.HIGH_GLOSS: 1.3,
+    Finish.MATTE: 1.1,
 }
 
 # -----------------------------
@@ -103,43 +192,40 @@ def read_root():
 def hello():
     return {"message": "Hello from ChromaPrint API"}
 
+# Static part of the health payload, built once at import. The per-request
+# handler only copies it; the Mongo round-trip is opt-in via ?full=1 so
+# health-check scrapers don't hit the database.
+_BASE_HEALTH = {
+    "backend": "✅ Running",
+    "database": "✅ Available" if db is not None else "⚠️ Available but not initialized",
+    "database_url": "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set",
+    "database_name": db.name if db is not None else "❌ Not Set",
+    "connection_status": "Connected" if db is not None else "Not Connected",
+    "collections": [],
+}
+
 @app.get("/test")
-def test_database():
-    response = {
-        "backend": "✅ Running",
-        "database": "❌ Not Available",
-        "database_url": "❌ Not Set",
-        "database_name": "❌ Not Set",
-        "connection_status": "Not Connected",
-        "collections": []
-    }
+async def test_database(full: bool = False):
+    response = _BASE_HEALTH.copy()
+    if not full or db is None:
+        return response
     try:
-        if db is not None:
-            response["database"] = "✅ Available"
-            response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = db.name
-            response["connection_status"] = "Connected"
-            try:
-                response["collections"] = db.list_collection_names()
-                response["database"] = "✅ Connected & Working"
-            except Exception as e:
-                response["database"] = f"⚠️ Connected but Error: {str(e)[:80]}"
-        else:
-            response["database"] = "⚠️ Available but not initialized"
+        response["collections"] = await db.list_collection_names()
+        response["database"] = "✅ Connected & Working"
     except Exception as e:
-        response["database"] = f"❌ Error: {str(e)[:80]}"
+        response["database"] = f"⚠️ Connected but Error: {str(e)[:80]}"
     return response
 
 # -----------------------------
 # Auth (demo)
 # -----------------------------
 @app.post("/api/auth/login")
-def login(req: LoginRequest):
-    if req.email == DEMO_EMAIL and req.password == DEMO_PASSWORD:
+async def login(req: LoginRequest):
+    if req.email == DEMO_EMAIL and hmac.compare_digest(hashlib.sha256(req.password.encode()).digest(), _DEMO_PW_HASH):
         # Optionally seed a demo user record
         try:
             if db is not None:
-                db["user"].update_one(
+                await db["user"].update_one(
                     {"email": DEMO_EMAIL},
                     {"$setOnInsert": {"name": "Demo User", "email": DEMO_EMAIL, "created_at": datetime.utcnow()}},
                     upsert=True,
@@ -152,37 +238,52 @@ def login(req: LoginRequest):
 # -----------------------------
 # Printers (seed + list)
 # -----------------------------
+# The catalog changes rarely, so cache the serialized payload in-process
+# as (timestamp, bytes) and skip the count/find/encode work within the TTL.
+_PRINTERS_CACHE_TTL = 60.0
+_printers_cache: Optional[tuple] = None
+
 @app.get("/api/printers")
-def list_printers():
+async def list_printers():
+    global _printers_cache
     if db is None:
         # Fallback to in-memory results if db not available
-        return {"items": SAMPLE_PRINTERS}
-    # Seed if empty
-    if db[PRINTER_COLLECTION].count_documents({}) == 0:
-        try:
-            db[PRINTER_COLLECTION].insert_many([{**p, "created_at": datetime.utcnow()} for p in SAMPLE_PRINTERS])
-        except Exception:
-            pass
-    items = list(db[PRINTER_COLLECTION].find({}, {"_id": 0}))
-    return {"items": items}
+        return Response(content=_SAMPLE_PRINTERS_JSON, media_type="application/json")
+    now = time.time()
+    if _printers_cache is not None and now - _printers_cache[0] < _PRINTERS_CACHE_TTL:
+        return Response(content=_printers_cache[1], media_type="application/json")
+    items = await db[PRINTER_COLLECTION].find({}, {"_id": 0}).to_list(100)
+    payload = orjson.dumps({"items": items})
+    _printers_cache = (now, payload)
+    return Response(content=payload, media_type="application/json")
 
 # -----------------------------
 # AI Cost Estimator (mock)
 # -----------------------------
-@app.post("/api/estimate")
-def estimate_cost(req: EstimateRequest):
+# Template copied per request instead of building a fresh dict literal:
+# keys stay interned and the constant fields are pre-filled.
+_LINE_ITEMS_TEMPLATE = {
+    "material": 0.0,
+    "machine": 0.0,
+    "handling": 80.0,
+    "skin_tone_color_match": 60.0,
+}
+
+@lru_cache(maxsize=4096)
+def _compute_estimate(length_mm, width_mm, height_mm, material, finish, complexity, infill, model_volume_mm3):
+    """Pure numeric core of the estimate; memoized on quantized inputs."""
     # Derive volume (mm^3). If model provided, use it; else approximate bounding box * infill factor.
-    if req.model_volume_mm3 is not None and req.model_volume_mm3 > 0:
-        volume_mm3 = req.model_volume_mm3 * max(0.05, min(1.0, req.infill))
+    if model_volume_mm3 is not None and model_volume_mm3 > 0:
+        volume_mm3 = model_volume_mm3 * max(0.05, min(1.0, infill))
     else:
-        bbox_mm3 = req.length_mm * req.width_mm * req.height_mm
+        bbox_mm3 = length_mm * width_mm * height_mm
         # shell + infill approximation
-        volume_mm3 = bbox_mm3 * (0.02 + 0.78 * req.infill)
+        volume_mm3 = bbox_mm3 * (0.02 + 0.78 * infill)
 
     volume_cm3 = volume_mm3 / 1000.0  # 1 cm3 = 1000 mm3
 
-    material_rate = MATERIAL_RATE_PER_CM3_INR.get(req.material, 5.0)
-    finish_mult = FINISH_MULTIPLIER.get(req.finish, 1.0)
+    material_rate = MATERIAL_RATE_PER_CM3_INR[material]
+    finish_mult = FINISH_MULTIPLIER[finish]
 
     base_cost = volume_cm3 * material_rate
     machine_time_hours = max(0.5, volume_cm3 / 8.0)  # heuristic
@@ -190,33 +291,103 @@ def estimate_cost(req: EstimateRequest):
     handling = 80.0
     color_match = 60.0  # for skin-tone profiling
 
-    subtotal = (base_cost + machine_cost + handling + color_match) * req.complexity
+    subtotal = (base_cost + machine_cost + handling + color_match) * complexity
     estimated_cost = max(150.0, subtotal * finish_mult)
 
-    breakdown = {
-        "volume_cm3": round(volume_cm3, 2),
-        "material_rate_inr_per_cm3": material_rate,
-        "machine_time_hours": round(machine_time_hours, 2),
-        "finish_multiplier": finish_mult,
-        "complexity": req.complexity,
-        "line_items": {
-            "material": round(base_cost, 2),
-            "machine": round(machine_cost, 2),
-            "handling": handling,
-            "skin_tone_color_match": color_match,
-        },
-    }
+    return volume_cm3, material_rate, machine_time_hours, finish_mult, base_cost, machine_cost, estimated_cost
+
+@app.post("/api/estimate")
+async def estimate_cost(request: Request):
+    # Parse the raw body ourselves: orjson + a single model_validate call
+    # skips FastAPI's dependency solver on this very hot endpoint.
+    try:
+        req = EstimateRequest.model_validate(orjson.loads(await request.body()))
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Invalid JSON body")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    # Quantize the free-floating inputs so repeat "what-if" requests hit the cache.
+    volume_cm3, material_rate, machine_time_hours, finish_mult, base_cost, machine_cost, estimated_cost = _compute_estimate(
+        req.length_mm,
+        req.width_mm,
+        req.height_mm,
+        req.material,
+        req.finish,
+        round(req.complexity, 2),
+        round(req.infill, 3),
+        round(req.model_volume_mm3, 1) if req.model_volume_mm3 is not None else None,
+    )
+
+    line_items = _LINE_ITEMS_TEMPLATE.copy()
+    line_items["material"] = round(base_cost, 2)
+    line_items["machine"] = round(machine_cost, 2)
+
+    breakdown = BreakdownModel.model_construct(
+        volume_cm3=round(volume_cm3, 2),
+        material_rate_inr_per_cm3=material_rate,
+        machine_time_hours=round(machine_time_hours, 2),
+        finish_multiplier=finish_mult,
+        complexity=req.complexity,
+        line_items=line_items,
+    )
 
-    return {"currency": "INR", "estimated_cost": round(estimated_cost, 2), "breakdown": breakdown}
+    resp = EstimateResponse.model_construct(
+        currency="INR",
+        estimated_cost=round(estimated_cost, 2),
+        breakdown=breakdown,
+    )
+    return ORJSONResponse(content=resp.model_dump())
+
+@app.post("/api/estimate/batch")
+def estimate_batch(reqs: List[EstimateRequest]):
+    """Vectorized batch estimator: one NumPy pass instead of per-row Python arithmetic."""
+    if not reqs:
+        return ORJSONResponse(content={"currency": "INR", "items": []})
+
+    bbox = (
+        np.array([r.length_mm for r in reqs])
+        * np.array([r.width_mm for r in reqs])
+        * np.array([r.height_mm for r in reqs])
+    )
+    infill = np.array([r.infill for r in reqs])
+    mv = np.array([r.model_volume_mm3 or 0.0 for r in reqs])
+    complexity = np.array([r.complexity for r in reqs])
+    rates = np.array([MATERIAL_RATE_PER_CM3_INR[r.material] for r in reqs])
+    finish_mult = np.array([FINISH_MULTIPLIER[r.finish] for r in reqs])
+
+    # Same volume heuristic as the single-item endpoint.
+    volume_mm3 = np.where(mv > 0, mv * np.clip(infill, 0.05, 1.0), bbox * (0.02 + 0.78 * infill))
+    volume_cm3 = volume_mm3 / 1000.0
+
+    base_cost = volume_cm3 * rates
+    machine_time_hours = np.maximum(0.5, volume_cm3 / 8.0)
+    machine_cost = machine_time_hours * 120.0
+
+    subtotal = (base_cost + machine_cost + 80.0 + 60.0) * complexity
+    estimated_cost = np.maximum(150.0, subtotal * finish_mult)
+
+    items = [
+        {"estimated_cost": cost, "volume_cm3": vol, "machine_time_hours": hrs}
+        for cost, vol, hrs in zip(
+            np.round(estimated_cost, 2).tolist(),
+            np.round(volume_cm3, 2).tolist(),
+            np.round(machine_time_hours, 2).tolist(),
+        )
+    ]
+    return ORJSONResponse(content={"currency": "INR", "items": items})
 
 # -----------------------------
 # Quote submission
 # -----------------------------
-@app.post("/api/quote")
-def submit_quote(body: QuoteRequest, x_demo_token: Optional[str] = Header(default=None)):
+async def require_demo(x_demo_token: Optional[str] = Header(default=None)) -> bool:
+    """Shared auth dependency: FastAPI caches its result per request."""
     if x_demo_token != DEMO_TOKEN:
         raise HTTPException(status_code=401, detail="Authentication required. Please login with demo credentials.")
+    return True
 
+@app.post("/api/quote")
+async def submit_quote(body: QuoteRequest, _: bool = Depends(require_demo)):
     data = {
         "email": body.email,
         "name": body.name,
@@ -230,27 +401,48 @@ def submit_quote(body: QuoteRequest, x_demo_token: Optional[str] = Header(defaul
         # Simulate success without persistence
         return {"ok": True, "message": "Quote submitted. Final price will be emailed (simulated)."}
 
-    quote_id = create_document(QUOTE_COLLECTION, data)
+    quote_id = await create_document(QUOTE_COLLECTION, data)
     return {"ok": True, "id": quote_id, "message": "Quote submitted. Final price will be emailed (simulated)."}
 
 # -----------------------------
 # Account - orders/quotes list
 # -----------------------------
 @app.get("/api/account/orders")
-def list_orders(email: str):
+async def list_orders(email: str):
     if db is None:
         return {"items": []}
-    docs = get_documents(QUOTE_COLLECTION, {"email": email}, limit=50)
-    # Convert ObjectId to string for _id if present
-    items = []
-    for d in docs:
-        d_copy = {k: v for k, v in d.items() if k != "_id"}
-        if "_id" in d:
-            d_copy["id"] = str(d["_id"])
-        items.append(d_copy)
-    return {"items": items}
+    # Shape documents server-side: stringify _id into "id" and strip _id
+    # in the pipeline so no per-doc rebuild is needed in Python.
+    cursor = db[QUOTE_COLLECTION].aggregate([
+        {"$match": {"email": email}},
+        {"$sort": {"created_at": -1}},
+        {"$limit": 50},
+        {"$addFields": {"id": {"$toString": "$_id"}}},
+        {"$project": {"_id": 0}},
+    ])
+
+    # Stream documents as they arrive instead of materializing the list,
+    # overlapping Mongo I/O with the wire send.
+    async def gen():
+        yield b'{"items":['
+        first = True
+        async for doc in cursor:
+            yield (b"" if first else b",") + orjson.dumps(doc)
+            first = False
+        yield b"]}"
+
+    return StreamingResponse(gen(), media_type="application/json")
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # uvloop + httptools replace the pure-Python event loop and HTTP parser;
+    # the app is passed as an import string so multiple workers can fork.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "2")),
+    )